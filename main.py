@@ -1,12 +1,19 @@
 # main.py
+import asyncio
+import hashlib
+import heapq
 import secrets
-from fastapi import FastAPI, HTTPException, Header, Depends
+import time
+import numpy as np
+import orjson
+from functools import lru_cache
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict
-from datetime import datetime, timedelta
+from fastapi.responses import ORJSONResponse
+from typing import Dict, List, Tuple
 
 from models import APIResponse
-from utils import GEN_DF, EM_DF
+from utils import GEN_DF, segment_sums, NATIONAL_TOTAL_GEN, NATIONAL_TOTAL_EM, EM_BY_COUNTY
 
 # -----------------------------------
 # TAG METADATA (THIS FIXES VISIBILITY)
@@ -59,6 +66,7 @@ app = FastAPI(
     ),
     version="1.2.1",
     openapi_tags=tags_metadata,
+    default_response_class=ORJSONResponse,
     contact={"name": "Simon Wanyoike", "email": "symoprof83@gmail.com"}
 )
 
@@ -76,92 +84,196 @@ app.add_middleware(
 # -----------------------------------
 # API KEY MANAGEMENT
 # -----------------------------------
-API_KEYS: Dict[str, datetime] = {}
+API_KEYS: Dict[str, int] = {}  # key -> unix-seconds deadline
 KEY_EXPIRATION_MINUTES = 30
 
+# Min-heap of (expires_at, key) so expired keys are found without scanning API_KEYS
+_EXPIRY_HEAP: List[Tuple[int, str]] = []
+MAX_EVICTIONS_PER_CALL = 32
+
 
 @app.get("/api/generate-key", tags=["Authentication"])
-def generate_key():
+async def generate_key():
     new_key = secrets.token_urlsafe(16)
-    expires_at = datetime.utcnow() + timedelta(minutes=KEY_EXPIRATION_MINUTES)
+    expires_at = int(time.time()) + KEY_EXPIRATION_MINUTES * 60
     API_KEYS[new_key] = expires_at
+    heapq.heappush(_EXPIRY_HEAP, (expires_at, new_key))
     return {
         "api_key": new_key,
-        "expires_at": expires_at.isoformat() + "Z"
+        "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(expires_at))
     }
 
 
-def verify_api_key(x_api_key: str = Header(...)):
-    now = datetime.utcnow()
-    expired = [k for k, v in API_KEYS.items() if v < now]
-    for k in expired:
-        del API_KEYS[k]
+def _evict_expired_keys(now: int):
+    # Bounded eviction so a burst of expirations never stalls one request
+    evicted = 0
+    while _EXPIRY_HEAP and _EXPIRY_HEAP[0][0] < now and evicted < MAX_EVICTIONS_PER_CALL:
+        expires_at, k = heapq.heappop(_EXPIRY_HEAP)
+        if API_KEYS.get(k) == expires_at:
+            del API_KEYS[k]
+        evicted += 1
+
+
+async def verify_api_key(x_api_key: str = Header(...)):
+    now = int(time.time())
 
-    if x_api_key not in API_KEYS:
+    # Heap head is the next deadline; nothing to evict until it has passed
+    if _EXPIRY_HEAP and _EXPIRY_HEAP[0][0] < now:
+        _evict_expired_keys(now)
+
+    expires_at = API_KEYS.get(x_api_key)
+    if expires_at is None or expires_at < now:
         raise HTTPException(status_code=401, detail="Invalid or expired API key")
 
 
+# -----------------------------------
+# HTTP CACHING (ETAG / 304)
+# -----------------------------------
+OVERVIEW_CACHE_CONTROL = "public, max-age=3600"
+SUMMARY_CACHE_CONTROL = "private, no-cache"  # authenticated; always revalidate
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def cached_json_response(request: Request, body: bytes, etag: str, cache_control: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or etag in (tag.strip() for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
 # -----------------------------------
 # OVERVIEW (VISIBLE AT / AND /DOCS)
 # -----------------------------------
+_OVERVIEW_BYTES = orjson.dumps({
+    "system": "National Energy Insights System (NEIS)",
+    "description": (
+        "NEIS integrates national datasets with user-entered inputs to deliver "
+        "transparent energy generation and carbon emissions intelligence. "
+        "Users can enable or disable automatic emissions estimation, "
+        "manually override values, and audit the origin of reported figures."
+    ),
+    "features": [
+        "Automatic emissions estimation",
+        "Manual emissions override",
+        "County & national insights",
+        "Audit flags for transparency",
+        "API-first design"
+    ],
+    "documentation": "/docs"
+})
+_OVERVIEW_ETAG = make_etag(_OVERVIEW_BYTES)
+
+
 @app.get("/", tags=["Overview"])
-def overview():
-    return {
-        "system": "National Energy Insights System (NEIS)",
-        "description": (
-            "NEIS integrates national datasets with user-entered inputs to deliver "
-            "transparent energy generation and carbon emissions intelligence. "
-            "Users can enable or disable automatic emissions estimation, "
-            "manually override values, and audit the origin of reported figures."
-        ),
-        "features": [
-            "Automatic emissions estimation",
-            "Manual emissions override",
-            "County & national insights",
-            "Audit flags for transparency",
-            "API-first design"
-        ],
-        "documentation": "/docs"
-    }
+async def overview(request: Request):
+    return cached_json_response(request, _OVERVIEW_BYTES, _OVERVIEW_ETAG, OVERVIEW_CACHE_CONTROL)
+
+
+# -----------------------------------
+# RESPONSE ENVELOPE
+# -----------------------------------
+def success_response(data: dict) -> dict:
+    """APIResponse-shaped body, built without Pydantic validation."""
+    return {"status": "success", "data": data, "message": None}
 
 
 # -----------------------------------
 # IN-MEMORY MANUAL OVERRIDES
 # -----------------------------------
 MANUAL_EMISSIONS_OVERRIDE: Dict[str, float] = {}
+_OVERRIDE_VERSION = 0  # bumped on every override write
+_OVERRIDE_LOCK = asyncio.Lock()  # writers only; reads stay lock-free
+
+# Serialized default-flags national summary and its ETag, keyed by _OVERRIDE_VERSION
+_SUMMARY_CACHE: Dict[int, Tuple[bytes, str]] = {}
 
 # -----------------------------------
-# COUNTY GENERATION DATA (NO EMISSIONS)
+# COUNTY GENERATION DATA (+ CALCULATED EMISSIONS)
 # -----------------------------------
-counties_data = {}
-
-if "county" in GEN_DF.columns:
-    for county in GEN_DF["county"].dropna().unique():
+@lru_cache(maxsize=1)
+def get_counties_data() -> dict:
+    """Built on first use so workers that never serve county data skip it."""
+    counties_data = {}
+    if "county" not in GEN_DF.columns:
+        return counties_data
+
+    # Segment sums over categorical codes instead of pandas groupby
+    counties = GEN_DF["county"].cat.categories
+    county_codes = GEN_DF["county"].cat.codes.to_numpy(dtype=np.int64)
+    values = GEN_DF["generation_mwh"].to_numpy(dtype=np.float64)
+    valid = county_codes >= 0
+    county_codes, values = county_codes[valid], values[valid]
+
+    codes, totals = segment_sums(county_codes, values)
+
+    by_source_lists: Dict[int, list] = {}
+    if "source" in GEN_DF.columns:
+        sources = GEN_DF["source"].cat.categories
+        source_codes = GEN_DF["source"].cat.codes.to_numpy(dtype=np.int64)[valid]
+        has_source = source_codes >= 0
+        pair_keys, pair_sums = segment_sums(
+            county_codes[has_source] * len(sources) + source_codes[has_source],
+            values[has_source]
+        )
+        # Sorted keys keep each county's sources in category (alphabetical) order
+        for key, value in zip(pair_keys.tolist(), pair_sums.tolist()):
+            code, src = divmod(key, len(sources))
+            by_source_lists.setdefault(code, []).append({
+                "source": sources[src],
+                "generation_MWh": value
+            })
+
+    # Counties in order of first appearance in the data
+    _, first_seen = np.unique(county_codes, return_index=True)
+    for i in np.argsort(first_seen).tolist():
+        code = int(codes[i])
+        county = counties[code]
         counties_data[county] = {
             "county": county,
-            "total_generation": float(
-                GEN_DF[GEN_DF["county"] == county]["generation_mwh"].sum()
-            ),
-            "by_source": [
-                {
-                    "source": src,
-                    "generation_MWh": float(grp["generation_mwh"].sum())
-                }
-                for src, grp in GEN_DF[GEN_DF["county"] == county].groupby("source")
-            ] if "source" in GEN_DF.columns else []
+            "total_generation": float(totals[i]),
+            "by_source": by_source_lists.get(code, []),
+            "total_emissions": EM_BY_COUNTY.get(county, 0.0)
         }
 
+    return counties_data
+
+
+@lru_cache(maxsize=1)
+def get_county_calculated_responses() -> Dict[str, bytes]:
+    """Serialized calculated-emissions responses, one per county."""
+    return {
+        name: orjson.dumps(success_response({**county, "emissions_source": "calculated"}))
+        for name, county in get_counties_data().items()
+    }
+
 
 # -----------------------------------
 # NATIONAL SUMMARY
 # -----------------------------------
 @app.get(
     "/api/energy/summary",
-    response_model=APIResponse,
+    responses={200: {"model": APIResponse}},
     tags=["National Data"],
     dependencies=[Depends(verify_api_key)]
 )
-def national_summary(estimate_emissions: bool = True, use_manual_override: bool = True):
+async def national_summary(
+    request: Request,
+    estimate_emissions: bool = True,
+    use_manual_override: bool = True
+):
+
+    use_cache = estimate_emissions and use_manual_override
+    if use_cache:
+        cached = _SUMMARY_CACHE.get(_OVERRIDE_VERSION)
+        if cached is not None:
+            return cached_json_response(request, *cached, SUMMARY_CACHE_CONTROL)
 
     if not estimate_emissions:
         emissions = 0.0
@@ -172,18 +284,24 @@ def national_summary(estimate_emissions: bool = True, use_manual_override: bool
         source = "user_entered"
 
     else:
-        emissions = float(EM_DF["emissions_tCO2"].sum()) if "emissions_tCO2" in EM_DF.columns else 0.0
+        emissions = NATIONAL_TOTAL_EM
         source = "calculated"
 
-    return {
-        "status": "success",
-        "data": {
-            "total_generation": float(GEN_DF["generation_mwh"].sum()),
-            "total_emissions": emissions,
-            "emissions_source": source,
-            "renewable_share": 65.5
-        }
-    }
+    payload = success_response({
+        "total_generation": NATIONAL_TOTAL_GEN,
+        "total_emissions": emissions,
+        "emissions_source": source,
+        "renewable_share": 65.5
+    })
+
+    if use_cache:
+        body = orjson.dumps(payload)
+        cached = (body, make_etag(body))
+        _SUMMARY_CACHE.clear()
+        _SUMMARY_CACHE[_OVERRIDE_VERSION] = cached
+        return cached_json_response(request, *cached, SUMMARY_CACHE_CONTROL)
+
+    return ORJSONResponse(payload)
 
 
 # -----------------------------------
@@ -191,12 +309,13 @@ def national_summary(estimate_emissions: bool = True, use_manual_override: bool
 # -----------------------------------
 @app.get(
     "/api/energy/county/{name}",
-    response_model=APIResponse,
+    responses={200: {"model": APIResponse}},
     tags=["County Data"],
     dependencies=[Depends(verify_api_key)]
 )
-def county_insights(name: str, estimate_emissions: bool = True, use_manual_override: bool = True):
+async def county_insights(name: str, estimate_emissions: bool = True, use_manual_override: bool = True):
 
+    counties_data = get_counties_data()
     county = counties_data.get(name)
     if not county:
         raise HTTPException(status_code=404, detail="County not found")
@@ -210,19 +329,13 @@ def county_insights(name: str, estimate_emissions: bool = True, use_manual_overr
         source = "user_entered"
 
     else:
-        emissions = float(
-            EM_DF[EM_DF["county"] == name]["emissions_tCO2"].sum()
-        ) if "emissions_tCO2" in EM_DF.columns else 0.0
-        source = "calculated"
+        return Response(get_county_calculated_responses()[name], media_type="application/json")
 
-    return {
-        "status": "success",
-        "data": {
-            **county,
-            "total_emissions": emissions,
-            "emissions_source": source
-        }
-    }
+    return ORJSONResponse(success_response({
+        **county,
+        "total_emissions": emissions,
+        "emissions_source": source
+    }))
 
 
 # -----------------------------------
@@ -233,11 +346,15 @@ def county_insights(name: str, estimate_emissions: bool = True, use_manual_overr
     tags=["Manual Input"],
     dependencies=[Depends(verify_api_key)]
 )
-def set_manual_emissions(scope: str, value: float):
+async def set_manual_emissions(scope: str, value: float):
+    global _OVERRIDE_VERSION
+
     if value < 0:
         raise HTTPException(status_code=400, detail="Value must be non-negative")
 
-    MANUAL_EMISSIONS_OVERRIDE[scope] = value
+    async with _OVERRIDE_LOCK:
+        MANUAL_EMISSIONS_OVERRIDE[scope] = value
+        _OVERRIDE_VERSION += 1
     return {
         "status": "success",
         "scope": scope,
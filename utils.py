@@ -1,13 +1,52 @@
 # api/utils.py
 import os
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CSV_ENGINE = "pyarrow" if HAS_PYARROW else "c"  # pyarrow: multithreaded C++ parser
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), "../data")  # adjust path to your data folder
 
 # Expected columns
 GEN_COLUMNS = ["date", "generation_mwh", "county"]
 EM_COLUMNS = ["date", "emissions_tCO2", "county"]
 
+# NaN defaults for the columns the API actually sums or groups on
+FILL_SPEC = {"generation_mwh": 0.0, "emissions_tCO2": 0.0, "county": "", "source": ""}
+
+# Low-cardinality string columns stored as categoricals (int codes)
+CATEGORY_COLUMNS = ["county", "source"]
+
+def read_csv_cached(file_path):
+    """
+    Reads a CSV, reusing a Feather copy saved next to it when that copy
+    is at least as new as the CSV. Saves the copy after a fresh parse.
+    """
+    if not HAS_PYARROW:
+        return pd.read_csv(file_path, engine=CSV_ENGINE)
+
+    cache_path = file_path + ".feather"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        return pd.read_feather(cache_path)
+
+    df = pd.read_csv(file_path, engine=CSV_ENGINE)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        # Write then rename so other workers never read a partial file
+        df.to_feather(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        # Read-only data folder or columns Feather can't store: skip the cache
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
 def load_csv_safe(filename, expected_columns):
     """
     Loads a CSV and ensures all expected columns exist.
@@ -15,7 +54,7 @@ def load_csv_safe(filename, expected_columns):
     """
     file_path = os.path.join(DATA_PATH, filename)
     if os.path.exists(file_path):
-        df = pd.read_csv(file_path)
+        df = read_csv_cached(file_path)
     else:
         df = pd.DataFrame(columns=expected_columns)
 
@@ -24,15 +63,42 @@ def load_csv_safe(filename, expected_columns):
         if col not in df.columns:
             df[col] = 0 if "mwh" in col or "emissions" in col else ""
 
-    # Optional: fill NaNs with defaults
-    for col in df.columns:
-        if df[col].dtype.kind in 'iufc':  # numeric columns
-            df[col] = df[col].fillna(0)
-        else:
-            df[col] = df[col].fillna("")
+    # Fill NaNs only in the columns the API reads
+    for col, default in FILL_SPEC.items():
+        if col in df.columns:
+            df[col] = df[col].fillna(default)
+
+    # Categoricals make county/source equality checks and groupbys work on codes
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
 
     return df
 
+def segment_sums(keys, values):
+    """
+    Sums values per distinct integer key using one sort and np.add.reduceat.
+    Returns (sorted unique keys, sums) as aligned arrays.
+    """
+    if keys.size == 0:
+        return keys, values[:0]
+
+    order = np.argsort(keys, kind="stable")
+    keys_sorted = keys[order]
+    starts = np.flatnonzero(np.diff(keys_sorted, prepend=-1))
+    return keys_sorted[starts], np.add.reduceat(values[order], starts)
+
 # Load generation and emissions data
 GEN_DF = load_csv_safe("generation.csv", GEN_COLUMNS)
 EM_DF = load_csv_safe("emissions.csv", EM_COLUMNS)
+
+# Column presence is fixed once loaded
+HAS_EMISSIONS_COL = "emissions_tCO2" in EM_DF.columns
+
+# Precomputed totals (the dataframes never change after load)
+NATIONAL_TOTAL_GEN = float(GEN_DF["generation_mwh"].sum())
+NATIONAL_TOTAL_EM = float(EM_DF["emissions_tCO2"].sum()) if HAS_EMISSIONS_COL else 0.0
+EM_BY_COUNTY = (
+    EM_DF.groupby("county", sort=False, observed=True)["emissions_tCO2"].sum().astype(float).to_dict()
+    if HAS_EMISSIONS_COL and "county" in EM_DF.columns else {}
+)